@@ -1,48 +1,85 @@
-# ============================================
-# SQLITE FIX - MUST BE FIRST
-# ============================================
-# Fix for Streamlit Cloud SQLite version issues
-import sys
-
-try:
-    __import__('pysqlite3')
-    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-except ImportError:
-    pass
-
 # ============================================
 # IMPORTS
 # ============================================
 import streamlit as st
 from langchain_anthropic import ChatAnthropic
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
 from dotenv import load_dotenv
+from openai import OpenAI, APIConnectionError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+import faiss
+import tiktoken
+import numpy as np
+import pymupdf
 import os
-import tempfile
+import multiprocessing
+import asyncio
 import logging
+import logging.handlers
+import queue
+import atexit
+import hashlib
+import pickle
+import shutil
+import tempfile
+import itertools
+import threading
+from contextlib import nullcontext
+from operator import itemgetter
+from collections import deque
+import json
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional
+from pdf_extraction import extract_page_texts
 
 # ============================================
 # LOGGING CONFIGURATION
 # ============================================
 
+@st.cache_resource(show_spinner=False)
 def setup_logging():
-    """Configure logging for the application."""
+    """
+    Configure logging for the application.
+    
+    Records are put on a queue and written to the log file and console by a
+    background QueueListener, so logging calls never block on disk I/O.
+    Cached so the handlers and listener thread are created once per process
+    rather than on every rerun. The log file rolls over at midnight, so a
+    long-running server still writes one file per day.
+    """
     
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
     
-    log_filename = log_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log"
+    log_filename = log_dir / "app.log"
     
     logger = logging.getLogger("RAG_App")
-    logger.setLevel(logging.DEBUG)
+    # INFO by default so DEBUG records are never built; set LOG_LEVEL=DEBUG to see them.
+    # getLevelName returns an int only for known level names.
+    level_name = os.getenv("LOG_LEVEL", "INFO").upper()
+    level = logging.getLevelName(level_name)
+    logger.setLevel(level if isinstance(level, int) else logging.INFO)
+    
+    # Re-run after Streamlit's "Clear cache": stop the previous listener
+    # thread and close its handlers before replacing them
+    previous_listener = getattr(logger, "queue_listener", None)
+    if previous_listener is not None:
+        atexit.unregister(previous_listener.stop)
+        previous_listener.stop()
+        for handler in previous_listener.handlers:
+            handler.close()
     
     if logger.handlers:
         logger.handlers.clear()
@@ -57,7 +94,14 @@ def setup_logging():
         datefmt='%H:%M:%S'
     )
     
-    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    file_handler = logging.handlers.TimedRotatingFileHandler(
+        log_filename, when="midnight", encoding='utf-8'
+    )
+    # Rotated files are named app_YYYYMMDD.log after the day they cover
+    file_handler.suffix = "%Y%m%d"
+    file_handler.namer = lambda name: os.path.join(
+        os.path.dirname(name), f"app_{name.rsplit('.', 1)[-1]}.log"
+    )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(detailed_formatter)
     
@@ -65,19 +109,32 @@ def setup_logging():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
     
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    log_queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        file_handler,
+        console_handler,
+        respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    logger.queue_listener = listener
+    
+    if not isinstance(level, int):
+        logger.warning(f"Unknown LOG_LEVEL {level_name!r}, using INFO")
     
     return logger
 
+# .env may set LOG_LEVEL, so load it before logging is configured
+load_dotenv()
 logger = setup_logging()
 
 # ============================================
 # ENVIRONMENT SETUP
 # ============================================
 
-load_dotenv()
-
 # Load from Streamlit secrets if available (for cloud deployment)
 if hasattr(st, 'secrets'):
     if 'ANTHROPIC_API_KEY' in st.secrets:
@@ -87,6 +144,61 @@ if hasattr(st, 'secrets'):
 
 logger.info("Environment variables loaded")
 
+# On-disk FAISS index cache, keyed by the uploaded file's content hash.
+# Bump FAISS_CACHE_VERSION whenever the way indexes are built changes.
+FAISS_CACHE_DIR = Path("faiss_cache")
+FAISS_CACHE_VERSION = 8
+# Total disk budget for cached indexes; least recently used ones are evicted
+FAISS_CACHE_MAX_BYTES = int(os.getenv("FAISS_CACHE_MAX_MB", "1024")) * 1024 * 1024
+# Bound the in-process caches: loaded stores (and the chains that reference
+# them) are shared by all sessions, so keep only a few recent ones in memory
+VECTOR_STORE_CACHE_MAX_ENTRIES = 4
+VECTOR_STORE_CACHE_TTL = 3600  # seconds
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Tokenizer used by text-embedding-3-small; chunk sizes are counted in its tokens
+EMBEDDING_ENCODING = "cl100k_base"
+
+# OpenAI accepts up to 2048 inputs per embeddings request
+EMBEDDING_BATCH_SIZE = 2048
+EMBEDDING_CONCURRENCY = 8
+EMBEDDING_MAX_ATTEMPTS = 6
+
+# PDFs with at least this many pages are extracted across worker processes
+PARALLEL_EXTRACTION_MIN_PAGES = 50
+# Each worker stays warm holding PyMuPDF
+MAX_EXTRACTION_WORKERS = 4
+# Pages are extracted in small batches, a few per worker at a time, so
+# only a bounded slice of a large document's text is held at once
+EXTRACTION_PAGES_PER_TASK = 16
+EXTRACTION_TASKS_PER_WORKER = 2
+
+# OpenAI Batch API: half the price of live requests, results within 24 hours
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# Pending batch id, saved under the index cache path so a restart resumes it
+BATCH_STATE_FILENAME = "batch.json"
+# Each /v1/embeddings request also has a total input token limit
+EMBEDDING_MAX_TOKENS_PER_REQUEST = 300_000
+
+# Embeddings are L2-normalized, so inner product equals cosine similarity.
+# Below FLAT_MAX_CHUNKS an exact flat scan is cheaper than graph traversal.
+FLAT_MAX_CHUNKS = 1000
+
+# HNSW graph parameters for approximate nearest neighbour search
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+# Large documents switch to a compressed IVF-PQ index
+IVFPQ_MIN_CHUNKS = 5000
+IVFPQ_NLIST = 256
+IVFPQ_M = 16
+IVFPQ_NBITS = 8
+# Stored on the index as its default; searches pass the nprobe slider per query
+IVFPQ_DEFAULT_NPROBE = 16
+# FAISS recommends at least 39 training points per IVF centroid
+IVFPQ_MIN_POINTS_PER_CENTROID = 39
+
 def validate_api_keys():
     """Check if required API keys are present."""
     missing_keys = []
@@ -130,27 +242,29 @@ if not keys_valid:
 # SESSION STATE INITIALIZATION
 # ============================================
 
-if "vector_store" not in st.session_state:
-    st.session_state.vector_store = None
-    logger.debug("Initialized vector_store in session state")
-
-if "chunks" not in st.session_state:
-    st.session_state.chunks = None
-    logger.debug("Initialized chunks in session state")
+def new_chat_history():
+    """
+    Create an empty chat history, stored as parallel lists per field.
+    """
+    return {"questions": [], "answers": [], "timestamps": [], "models": []}
 
-if "embedding" not in st.session_state:
-    st.session_state.embedding = None
-    logger.debug("Initialized embedding in session state")
-    
-if "processed_file" not in st.session_state:
-    st.session_state.processed_file = None
-    logger.debug("Initialized processed_file in session state")
-    
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-    logger.debug("Initialized chat_history in session state")
+@dataclass
+class SessionData:
+    """
+    All per-session state, kept under a single st.session_state key.
+    """
+    vector_store: Optional[FAISS] = None
+    chunks: Optional[list] = None
+    embedding: Optional[OpenAIEmbeddings] = None
+    processed_file: Optional[str] = None
+    processing_stats: dict = field(default_factory=dict)
+    chat_history: dict = field(default_factory=new_chat_history)
 
+if "data" not in st.session_state:
+    st.session_state.data = SessionData()
+    logger.debug("Initialized session data")
 
+session = st.session_state.data
 
 # ============================================
 # SIDEBAR CONFIGURATION
@@ -170,36 +284,67 @@ with st.sidebar:
     
     st.subheader("📄 Chunk Settings")
     chunk_size = st.number_input(
-        "Chunk Size", 
-        min_value=100, 
-        max_value=2000, 
-        value=1000, 
-        step=100
+        "Chunk Size (tokens)", 
+        min_value=50, 
+        max_value=1000, 
+        value=250, 
+        step=50
     )
     chunk_overlap = st.number_input(
-        "Chunk Overlap", 
+        "Chunk Overlap (tokens)", 
         min_value=0, 
-        max_value=500, 
-        value=200, 
-        step=50
+        max_value=250, 
+        value=50, 
+        step=25
     )
     logger.debug(f"Chunk settings - Size: {chunk_size}, Overlap: {chunk_overlap}")
+    
+    embedding_dimensions = st.select_slider(
+        "Embedding Dimensions",
+        options=[256, 512, 1024, 1536],
+        value=512,
+        help="Lower dimensions use less memory and search faster, at a small cost in recall"
+    )
+    logger.debug(f"Embedding dimensions set to: {embedding_dimensions}")
+    
+    use_batch_api = st.toggle(
+        "Batch API indexing (half price, slow)",
+        value=False,
+        key="use_batch_api",
+        help="Embed through OpenAI's Batch API at half the cost. The batch runs in the "
+             "background and can take up to 24 hours; its status is checked on each rerun "
+             "and survives app restarts. Turn off to build the index live instead"
+    )
+    logger.debug(f"Batch API indexing: {use_batch_api}")
+    
+    st.subheader("🔍 Retrieval Settings")
+    nprobe = st.slider(
+        "IVF nprobe",
+        min_value=1,
+        max_value=128,
+        value=IVFPQ_DEFAULT_NPROBE,
+        help=f"Clusters searched per query. Only used for documents over {IVFPQ_MIN_CHUNKS} chunks; "
+             f"higher is more accurate but slower"
+    )
+    logger.debug(f"IVF nprobe set to: {nprobe}")
+    
+    use_langchain_chain = st.toggle(
+        "Use LangChain RAG chain",
+        value=False,
+        help="Answer through a LangChain runnable chain instead of a direct Claude call"
+    )
+    logger.debug(f"LangChain RAG chain: {use_langchain_chain}")
 
     
     st.divider()
     
     if st.button("🗑️ Clear Chat History"):
-        st.session_state.chat_history = []
+        session.chat_history = new_chat_history()
         logger.info("Chat history cleared by user")
         st.rerun()
     
     if st.button("🔄 Reset All"):
-        st.session_state.vector_store = None
-        st.session_state.chunks = None
-        st.session_state.embedding = None
-        st.session_state.processed_file = None
-        st.session_state.chat_history = []
-        st.session_state.processing_stats = {}
+        st.session_state.data = SessionData()
         logger.info("All session data reset by user")
         st.rerun()
 
@@ -207,15 +352,325 @@ with st.sidebar:
 # VECTOR STORE FUNCTIONS (USING FAISS)
 # ============================================
 
-def create_vector_store(chunks, embedding):
+# The OpenAI client is built with max_retries=0, so this is the only retry
+# layer for embedding calls
+retry_embedding_errors = retry(
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError)),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(EMBEDDING_MAX_ATTEMPTS),
+    reraise=True
+)
+
+@retry_embedding_errors
+async def _embed_batch(batch, embedding):
+    """
+    Embed a single batch of texts, backing off on rate limit and transient errors.
+    """
+    return await embedding.aembed_documents(batch)
+
+@retry_embedding_errors
+def _embed_query(question, embedding):
+    """
+    Embed a question, backing off on rate limit and transient errors.
+    """
+    return embedding.embed_query(question)
+
+async def _embed_all(texts, embedding, concurrency=EMBEDDING_CONCURRENCY):
+    """
+    Embed texts in concurrent batches, bounded by a semaphore.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    batches = [
+        texts[i:i + EMBEDDING_BATCH_SIZE]
+        for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+    
+    async def embed_one(batch):
+        async with semaphore:
+            return await _embed_batch(batch, embedding)
+    
+    results = await asyncio.gather(*[embed_one(batch) for batch in batches])
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+def build_faiss_index(vectors):
+    """
+    Build an inner-product FAISS index suited to the number of vectors.
+    
+    Small documents use an exact flat index, medium documents an HNSW
+    graph, and large documents a trained IVF-PQ index, which is much smaller
+    and faster to search. Vectors must already be L2-normalized. The
+    returned index is ready to have them added.
+    """
+    num_vectors, dimension = vectors.shape
+    
+    if num_vectors <= FLAT_MAX_CHUNKS:
+        logger.debug(f"Built flat inner-product index (d={dimension})")
+        return faiss.IndexFlatIP(dimension)
+    
+    if num_vectors > IVFPQ_MIN_CHUNKS:
+        # Both the IVF centroids and each PQ codebook (2**nbits centroids)
+        # need enough training points, so shrink them for smaller documents
+        max_centroids = num_vectors // IVFPQ_MIN_POINTS_PER_CENTROID
+        nlist = min(IVFPQ_NLIST, max_centroids)
+        nbits = min(IVFPQ_NBITS, max_centroids.bit_length() - 1)
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(
+            quantizer, dimension, nlist, IVFPQ_M, nbits, faiss.METRIC_INNER_PRODUCT
+        )
+        logger.info(f"Training IVF-PQ index on {num_vectors} vectors (nlist={nlist})...")
+        index.train(vectors)
+        index.nprobe = IVFPQ_DEFAULT_NPROBE
+        logger.debug(
+            f"Built IVF-PQ index (d={dimension}, nlist={nlist}, "
+            f"m={IVFPQ_M}, nbits={nbits})"
+        )
+        return index
+    
+    index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    logger.debug(
+        f"Built HNSW index (d={dimension}, M={HNSW_M}, "
+        f"efConstruction={HNSW_EF_CONSTRUCTION}, efSearch={HNSW_EF_SEARCH})"
+    )
+    return index
+
+@st.cache_resource(show_spinner=False)
+def get_gpu_resources():
+    """
+    Allocate FAISS GPU resources once per process.
+    """
+    return faiss.StandardGpuResources()
+
+@st.cache_resource(show_spinner=False)
+def get_gpu_lock():
+    """
+    Create the lock that serializes use of the shared GPU resources.
+    
+    FAISS GPU indexes and StandardGpuResources are not thread-safe, even for
+    read-only searches, and every Streamlit session thread shares them.
+    """
+    return threading.Lock()
+
+def move_store_to_gpu(vector_store):
+    """
+    Move the store's index onto the first GPU when faiss-gpu and CUDA are available.
+    
+    Index types without a GPU implementation (such as HNSW) stay on the CPU.
+    A GPU index gets the shared GPU lock as vector_store.search_lock; CPU
+    indexes are safe for concurrent search and get none.
+    """
+    vector_store.search_lock = None
+    if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+        return vector_store
+    
+    try:
+        with get_gpu_lock():
+            gpu_index = faiss.index_cpu_to_gpu(get_gpu_resources(), 0, vector_store.index)
+    except RuntimeError as e:
+        logger.debug(f"Keeping FAISS index on CPU: {e}")
+        return vector_store
+    
+    vector_store.index = gpu_index
+    vector_store.search_lock = get_gpu_lock()
+    logger.info("FAISS index moved to GPU 0")
+    return vector_store
+
+def get_search_params(index, nprobe):
+    """
+    Build per-query search parameters for the index, if it takes any.
+    
+    Indexes are shared across sessions through st.cache_resource, so search
+    settings are passed with each query rather than set on the index.
+    """
+    if hasattr(index, "nprobe"):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    return None
+
+def _pack_embedding_requests(texts):
+    """
+    Group texts into request-sized runs for the Batch API.
+    
+    Returns (start, texts) pairs, each within the per-request input count
+    and token limits. start is the index of the run's first text.
+    """
+    encoding = tiktoken.get_encoding(EMBEDDING_ENCODING)
+    runs = []
+    start, run_tokens = 0, 0
+    for i, text in enumerate(texts):
+        text_tokens = len(encoding.encode_ordinary(text))
+        run_is_full = (
+            i - start >= EMBEDDING_BATCH_SIZE
+            or run_tokens + text_tokens > EMBEDDING_MAX_TOKENS_PER_REQUEST
+        )
+        if i > start and run_is_full:
+            runs.append((start, texts[start:i]))
+            start, run_tokens = i, 0
+        run_tokens += text_tokens
+    runs.append((start, texts[start:]))
+    return runs
+
+def _submit_embedding_batch(client, texts, embedding):
+    """
+    Upload the embedding requests as JSONL and create a batch for them.
+    """
+    body_params = {"model": embedding.model}
+    if embedding.dimensions:
+        body_params["dimensions"] = embedding.dimensions
+    
+    # One request line per run of texts; custom_id is the run's start offset
+    runs = _pack_embedding_requests(texts)
+    requests_jsonl = "\n".join(
+        json.dumps({
+            "custom_id": str(start),
+            "method": "POST",
+            "url": "/v1/embeddings",
+            "body": {**body_params, "input": run_texts}
+        })
+        for start, run_texts in runs
+    )
+    
+    batch_file = client.files.create(
+        file=("embeddings.jsonl", requests_jsonl.encode("utf-8")),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/embeddings",
+        completion_window=BATCH_COMPLETION_WINDOW
+    )
+    logger.info(f"Submitted embedding batch {batch.id} ({len(runs)} requests, {len(texts)} texts)")
+    return batch
+
+def _resume_batch(client, state_path):
+    """
+    Return the batch recorded at state_path, or None if there is none.
+    """
+    if not state_path.exists():
+        return None
+    
+    try:
+        batch_id = json.loads(state_path.read_text())["batch_id"]
+        return client.batches.retrieve(batch_id)
+    except Exception as e:
+        logger.warning(f"Could not resume embedding batch from {state_path}: {e}")
+        state_path.unlink(missing_ok=True)
+        return None
+
+def _read_batch_vectors(client, batch, num_texts):
+    """
+    Download a completed batch's output and put the vectors back in input order.
+    """
+    vectors = [None] * num_texts
+    output = client.files.content(batch.output_file_id).text
+    for line in output.splitlines():
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            raise RuntimeError(f"Embedding request {result.get('custom_id')} failed: {result.get('error')}")
+        start = int(result["custom_id"])
+        for item in response["body"]["data"]:
+            vectors[start + item["index"]] = item["embedding"]
+    
+    missing = sum(vector is None for vector in vectors)
+    if missing:
+        raise RuntimeError(f"Embedding batch {batch.id} is missing {missing} result(s)")
+    return vectors
+
+def check_embedding_batch(cache_path, load_chunks, embedding):
+    """
+    Advance the Batch API build of the index at cache_path by one step.
+    
+    Never waits: submits a batch if none is pending, otherwise checks the
+    pending one once. When it has completed, the index is built from its
+    results and saved to cache_path, where load_or_create_vector_store
+    picks it up. Returns the batch while it is still running, else None.
+    
+    The batch id is saved next to the index, so a pending batch survives
+    app restarts and is checked again on the next upload of the same file.
+    """
+    state_path = cache_path / BATCH_STATE_FILENAME
+    client = OpenAI()
+    batch = _resume_batch(client, state_path)
+    
+    if batch is None:
+        texts = [chunk.page_content for chunk in load_chunks()]
+        batch = _submit_embedding_batch(client, texts, embedding)
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        state_path.write_text(json.dumps({"batch_id": batch.id}))
+        return batch
+    
+    if batch.status not in BATCH_TERMINAL_STATUSES:
+        logger.debug(f"Batch {batch.id} status: {batch.status} ({get_batch_progress(batch)})")
+        return batch
+    
+    # The batch is finished either way; a failed one must not be resumed
+    state_path.unlink(missing_ok=True)
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Embedding batch {batch.id} ended with status: {batch.status}")
+    
+    chunks = load_chunks()
+    vectors = _read_batch_vectors(client, batch, len(chunks))
+    logger.info(f"Embedding batch {batch.id} completed")
+    save_vector_store(create_vector_store(chunks, embedding, vectors), cache_path)
+    return None
+
+def get_batch_progress(batch):
+    """
+    Describe how many of the batch's requests have completed.
+    """
+    counts = batch.request_counts
+    return f"{counts.completed}/{counts.total} requests" if counts else "n/a"
+
+def cancel_embedding_batch(cache_path):
+    """
+    Cancel the batch pending for the index at cache_path and forget it.
+    """
+    state_path = cache_path / BATCH_STATE_FILENAME
+    if not state_path.exists():
+        return
+    
+    try:
+        batch_id = json.loads(state_path.read_text())["batch_id"]
+        OpenAI().batches.cancel(batch_id)
+        logger.info(f"Cancelled embedding batch {batch_id}")
+    except Exception as e:
+        logger.warning(f"Could not cancel embedding batch from {state_path}: {e}")
+    state_path.unlink(missing_ok=True)
+
+def create_vector_store(chunks, embedding, raw_vectors=None):
     """
     Create a FAISS vector store - more reliable than ChromaDB for Streamlit.
+    
+    Chunks are embedded live unless raw_vectors (from a batch) is given.
     """
     try:
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        
+        # Embed every chunk up front by dispatching live batches concurrently
+        if raw_vectors is None:
+            logger.info(
+                f"Embedding {len(texts)} chunks in batches of {EMBEDDING_BATCH_SIZE} "
+                f"(concurrency={EMBEDDING_CONCURRENCY})..."
+            )
+            raw_vectors = asyncio.run(_embed_all(texts, embedding))
+        vectors = np.asarray(raw_vectors, dtype="float32")
+        faiss.normalize_L2(vectors)
+        logger.debug(f"Received {len(vectors)} embeddings")
+        
         logger.info("Creating FAISS vector store...")
-        vector_store = FAISS.from_documents(
-            documents=chunks,
-            embedding=embedding
+        vector_store = FAISS(
+            embedding_function=embedding,
+            index=build_faiss_index(vectors),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        vector_store.add_embeddings(
+            text_embeddings=list(zip(texts, vectors)),
+            metadatas=metadatas
         )
         logger.info("FAISS vector store created successfully")
         return vector_store
@@ -224,67 +679,358 @@ def create_vector_store(chunks, embedding):
         logger.error(f"Error creating vector store: {e}", exc_info=True)
         raise
 
+def get_file_hash(file_bytes):
+    """
+    Compute a SHA-256 hash of the uploaded file's content.
+    """
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def get_cache_path(file_hash, chunk_size, chunk_overlap, embedding_model, embedding_dimensions):
+    """
+    Build the on-disk cache directory for a given file and index settings.
+    """
+    settings_key = (
+        f"v{FAISS_CACHE_VERSION}_{embedding_model}_dim{embedding_dimensions}"
+        f"_size{chunk_size}_overlap{chunk_overlap}"
+    )
+    return FAISS_CACHE_DIR / file_hash / settings_key
+
+def load_vector_store(cache_path, embedding):
+    """
+    Load a FAISS store saved with save_local, memory-mapping the index.
+    
+    With IO_FLAG_MMAP the OS page cache backs the index data instead of the
+    Python heap, so it is shared between sessions and workers. Only use this
+    on cache files written by this app, since index.pkl is unpickled.
+    """
+    index_path = str(cache_path / "index.faiss")
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        logger.debug(f"Memory-mapped FAISS index from {index_path}")
+    except RuntimeError as e:
+        logger.debug(f"Could not memory-map index, reading into memory: {e}")
+        index = faiss.read_index(index_path)
+    
+    with open(cache_path / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    
+    return FAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+    )
+
+def save_vector_store(vector_store, cache_path):
+    """
+    Persist a CPU-resident vector store to the on-disk cache.
+    """
+    try:
+        cache_path.mkdir(parents=True, exist_ok=True)
+        vector_store.save_local(str(cache_path))
+        logger.info(f"FAISS index saved to {cache_path}")
+    except Exception as e:
+        logger.warning(f"Could not save FAISS index to cache: {e}")
+        return
+    
+    try:
+        prune_faiss_cache(cache_path)
+    except OSError as e:
+        logger.warning(f"Could not prune FAISS cache: {e}")
+
+def _get_directory_size(path):
+    """
+    Total size in bytes of the files under path.
+    """
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+def prune_faiss_cache(keep_path):
+    """
+    Remove stale and least recently used indexes from the on-disk cache.
+    
+    Directories from older FAISS_CACHE_VERSIONs can never be loaded again, so
+    they are deleted outright. Then whole indexes are evicted, least recently
+    used first, until the cache fits in FAISS_CACHE_MAX_BYTES. keep_path and
+    directories holding a pending batch are never evicted.
+    """
+    current_prefix = f"v{FAISS_CACHE_VERSION}_"
+    entries = []
+    for path in FAISS_CACHE_DIR.glob("*/*"):
+        if not path.is_dir():
+            continue
+        if path.name.startswith(current_prefix):
+            entries.append(path)
+        else:
+            logger.info(f"Removing stale FAISS cache entry {path}")
+            shutil.rmtree(path, ignore_errors=True)
+    
+    sizes = {path: _get_directory_size(path) for path in entries}
+    total_size = sum(sizes.values())
+    candidates = [
+        path for path in entries
+        if path != keep_path and not (path / BATCH_STATE_FILENAME).exists()
+    ]
+    for path in sorted(candidates, key=lambda path: path.stat().st_mtime):
+        if total_size <= FAISS_CACHE_MAX_BYTES:
+            break
+        logger.info(f"Evicting FAISS cache entry {path} to stay under the size limit")
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= sizes[path]
+    
+    # Drop file hash directories left empty
+    for file_dir in FAISS_CACHE_DIR.iterdir():
+        if file_dir.is_dir() and not any(file_dir.iterdir()):
+            file_dir.rmdir()
+
+@st.cache_resource(
+    show_spinner=False,
+    max_entries=VECTOR_STORE_CACHE_MAX_ENTRIES,
+    ttl=VECTOR_STORE_CACHE_TTL
+)
+def load_or_create_vector_store(file_hash, chunk_size, chunk_overlap, embedding_model,
+                                embedding_dimensions, _load_chunks, _embedding):
+    """
+    Load a cached FAISS index from disk, or build and persist a new one.
+    
+    Arguments prefixed with an underscore are not hashed by Streamlit, so the
+    in-process cache is keyed by the file hash and index settings only.
+    _load_chunks is only called on a miss, so cache hits skip PDF parsing.
+    Indexes are always persisted from the CPU and moved to a GPU afterwards.
+    """
+    cache_path = get_cache_path(
+        file_hash, chunk_size, chunk_overlap, embedding_model, embedding_dimensions
+    )
+    
+    if (cache_path / "index.faiss").exists():
+        try:
+            logger.info(f"Loading cached FAISS index from {cache_path}")
+            vector_store = load_vector_store(cache_path, _embedding)
+            # Mark the entry as recently used for prune_faiss_cache
+            os.utime(cache_path)
+            move_store_to_gpu(vector_store)
+            return vector_store
+        except Exception as e:
+            logger.warning(f"Could not load cached index, rebuilding: {e}")
+    
+    vector_store = create_vector_store(_load_chunks(), _embedding)
+    save_vector_store(vector_store, cache_path)
+    
+    # A live build supersedes any batch still pending for this index
+    cancel_embedding_batch(cache_path)
+    
+    move_store_to_gpu(vector_store)
+    return vector_store
+
 # ============================================
 # PDF PROCESSING FUNCTIONS
 # ============================================
 
-def process_pdf(uploaded_file, chunk_size, chunk_overlap):
+def get_extraction_worker_count():
+    """
+    Number of extraction workers, based on the CPUs this process may use.
+    
+    os.cpu_count() reports every core on the host, ignoring affinity and
+    container limits, so prefer the scheduler affinity where available.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus, MAX_EXTRACTION_WORKERS))
+
+@st.cache_resource(show_spinner=False)
+def get_extraction_pool():
+    """
+    Create the PDF text extraction process pool, shared across reruns.
+    
+    Spawned (not forked) workers keep the pool safe to use from the
+    multi-threaded Streamlit server, and staying alive keeps them warm.
+    """
+    workers = get_extraction_worker_count()
+    logger.debug(f"Starting PDF extraction pool with {workers} workers")
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+def iter_pdf_pages(pdf_bytes, source):
+    """
+    Yield one Document per PDF page, reading small PDFs straight from memory.
+    
+    Large PDFs are split into small page batches and extracted in parallel
+    by the process pool, with a bounded number in flight; pages are still
+    yielded in order as their batch arrives.
+    """
+    workers = get_extraction_worker_count()
+    
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as pdf:
+        page_count = pdf.page_count
+        if page_count < PARALLEL_EXTRACTION_MIN_PAGES or workers == 1:
+            for page_number, page in enumerate(pdf):
+                yield Document(
+                    page_content=page.get_text(),
+                    metadata={"source": source, "page": page_number}
+                )
+            return
+    
+    logger.info(
+        f"Extracting {page_count} pages in batches of {EXTRACTION_PAGES_PER_TASK} "
+        f"across {workers} processes..."
+    )
+    
+    # Workers open the PDF from a temporary file, so its bytes are written
+    # once instead of being pickled into every task
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_file:
+        pdf_file.write(pdf_bytes)
+    
+    pool = get_extraction_pool()
+    max_in_flight = workers * EXTRACTION_TASKS_PER_WORKER
+    starts = iter(range(0, page_count, EXTRACTION_PAGES_PER_TASK))
+    pending = deque()
+    try:
+        page_number = 0
+        while True:
+            # Top up the in-flight batches, then yield the oldest one in page order
+            for start in itertools.islice(starts, max_in_flight - len(pending)):
+                stop = min(start + EXTRACTION_PAGES_PER_TASK, page_count)
+                pending.append(pool.submit(extract_page_texts, pdf_file.name, start, stop))
+            if not pending:
+                break
+            for text in pending.popleft().result():
+                yield Document(
+                    page_content=text,
+                    metadata={"source": source, "page": page_number}
+                )
+                page_number += 1
+    except BrokenProcessPool:
+        # Shut down and drop the dead pool so the next upload starts a fresh one
+        pool.shutdown(wait=False, cancel_futures=True)
+        get_extraction_pool.clear()
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+        os.unlink(pdf_file.name)
+
+def get_pdf_page_count(pdf_bytes):
+    """
+    Count the pages of an in-memory PDF without extracting any text.
+    """
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as pdf:
+        return pdf.page_count
+
+def split_pdf(pdf_bytes, source, chunk_size, chunk_overlap):
+    """
+    Extract the PDF's text and split it into token-sized chunks.
+    """
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=EMBEDDING_ENCODING,
+        chunk_size=chunk_size, 
+        chunk_overlap=chunk_overlap
+    )
+    
+    # Load and split the PDF one page at a time, so the full page list
+    # is never held in memory alongside the chunks
+    logger.info(f"Loading and splitting PDF (chunk_size={chunk_size}, overlap={chunk_overlap})...")
+    page_count = 0
+    empty_pages = 0
+    chunks = []
+    for page in iter_pdf_pages(pdf_bytes, source):
+        page_count += 1
+        if not page.page_content.strip():
+            # Scanned pages have no text layer; there is nothing to embed
+            empty_pages += 1
+            continue
+        chunks.extend(splitter.split_documents([page]))
+    logger.info(f"PDF loaded successfully. Pages: {page_count}")
+    
+    if page_count == 0:
+        raise ValueError("PDF appears to be empty or unreadable")
+    
+    if empty_pages:
+        logger.warning(f"Skipped {empty_pages} page(s) with no extractable text (scanned images?)")
+    
+    logger.info(f"Document split into {len(chunks)} chunks")
+    
+    if len(chunks) == 0:
+        raise ValueError("No text chunks were created from the PDF")
+    
+    return chunks
+
+def process_pdf(uploaded_file, chunk_size, chunk_overlap, embedding_dimensions, use_batch_api=False):
     """
     Process uploaded PDF file and create vector store.
+    
+    With use_batch_api, an index that is not cached yet is built through the
+    Batch API without waiting: while the batch is pending, the vector store is
+    None and stats describes the batch instead.
     """
     start_time = datetime.now()
     logger.info(f"Starting PDF processing: {uploaded_file.name}")
     
-    tmp_file_path = None
-    
     try:
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_file_path = tmp_file.name
-            logger.debug(f"Temporary file created: {tmp_file_path}")
-        
-        # Load the PDF
-        logger.info("Loading PDF document...")
-        loader = PyPDFLoader(file_path=tmp_file_path)
-        doc = loader.load()
-        logger.info(f"PDF loaded successfully. Pages: {len(doc)}")
-        
-        if len(doc) == 0:
-            raise ValueError("PDF appears to be empty or unreadable")
+        pdf_bytes = uploaded_file.getvalue()
         
         # Initialize embeddings
-        logger.info("Initializing OpenAI embeddings...")
-        embedding = OpenAIEmbeddings(model='text-embedding-3-small')
+        logger.info(f"Initializing OpenAI embeddings ({embedding_dimensions} dimensions)...")
+        embedding = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            dimensions=embedding_dimensions,
+            chunk_size=EMBEDDING_BATCH_SIZE,
+            max_retries=0
+        )
         logger.debug("Embeddings initialized")
         
-        # Split documents
-        logger.info(f"Splitting documents (chunk_size={chunk_size}, overlap={chunk_overlap})...")
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap
+        # Create vector store (or load it from a cache). The PDF is hashed
+        # first so that a cache hit never parses or splits it.
+        logger.info("Creating vector store...")
+        file_hash = get_file_hash(pdf_bytes)
+        logger.debug(f"File content hash: {file_hash}")
+        cache_path = get_cache_path(
+            file_hash, chunk_size, chunk_overlap, EMBEDDING_MODEL, embedding_dimensions
         )
-        chunks = splitter.split_documents(doc)
-        logger.info(f"Document split into {len(chunks)} chunks")
+        load_chunks = lambda: split_pdf(pdf_bytes, uploaded_file.name, chunk_size, chunk_overlap)
         
-        if len(chunks) == 0:
-            raise ValueError("No text chunks were created from the PDF")
+        if use_batch_api and not (cache_path / "index.faiss").exists():
+            batch = check_embedding_batch(cache_path, load_chunks, embedding)
+            if batch is not None:
+                logger.info(f"Embedding batch {batch.id} pending (status: {batch.status})")
+                return None, {
+                    "batch_id": batch.id,
+                    "batch_status": batch.status,
+                    "batch_progress": get_batch_progress(batch),
+                    "cache_path": cache_path
+                }, None, None
         
-        # Create vector store
-        logger.info("Creating vector store...")
-        vector_store = create_vector_store(chunks, embedding)
-        logger.info("Vector store created successfully")
+        vector_store = load_or_create_vector_store(
+            file_hash,
+            chunk_size,
+            chunk_overlap,
+            EMBEDDING_MODEL,
+            embedding_dimensions,
+            load_chunks,
+            embedding
+        )
+        logger.info("Vector store ready")
+        
+        chunks = [
+            vector_store.docstore.search(doc_id)
+            for doc_id in vector_store.index_to_docstore_id.values()
+        ]
+        page_count = get_pdf_page_count(pdf_bytes)
         
         # Calculate processing time
         processing_time = (datetime.now() - start_time).total_seconds()
         
         # Prepare stats
         stats = {
-            "pages": len(doc),
-            "chunks": len(chunks),
+            "pages": page_count,
+            "chunks": len(vector_store.index_to_docstore_id),
             "time": processing_time,
             "chunk_size": chunk_size,
-            "chunk_overlap": chunk_overlap
+            "chunk_overlap": chunk_overlap,
+            "embedding_dimensions": embedding_dimensions
         }
         
         logger.info(f"PDF processing completed in {processing_time:.2f} seconds")
@@ -294,72 +1040,147 @@ def process_pdf(uploaded_file, chunk_size, chunk_overlap):
     except Exception as e:
         logger.error(f"Error processing PDF: {str(e)}", exc_info=True)
         return None, None, None, None
-        
-    finally:
-        # Clean up temp file
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            try:
-                os.unlink(tmp_file_path)
-                logger.debug("Cleaned up temporary file")
-            except Exception as e:
-                logger.warning(f"Could not delete temp file: {e}")
 
-def get_rag_response(question, vector_store, model_option, temperature):
+# ============================================
+# RAG CHAIN FUNCTIONS
+# ============================================
+
+# Number of chunks retrieved as context for each question
+RETRIEVAL_K = 4
+
+PROMPT = ChatPromptTemplate.from_template("""
+    Answer the question based on the provided context. 
+    If you don't know the answer or if the context doesn't contain 
+    relevant information, say you don't know.
+    
+    Context: {context}
+    
+    Question: {question}
+    
+    Answer:
+""")
+
+@st.cache_resource(show_spinner=False)
+def get_llm(model_option, temperature):
     """
-    Generate RAG response for a given question.
+    Create the Claude client once per model and temperature.
+    """
+    logger.debug(f"Initializing LLM: {model_option} with temperature={temperature}")
+    return ChatAnthropic(model=model_option, temperature=temperature, streaming=True)
+
+@st.cache_resource(
+    show_spinner=False,
+    max_entries=VECTOR_STORE_CACHE_MAX_ENTRIES,
+    ttl=VECTOR_STORE_CACHE_TTL
+)
+def _build_chain(model_option, temperature, vector_store_id, _vector_store):
+    """
+    Build the RAG chain once per model, temperature and vector store.
+    
+    The vector store itself is not hashed; its id() keys the cache instead.
+    The cached chain keeps a reference to the store, so the id cannot be
+    reused while the entry is alive.
+    
+    Retrieval goes through retrieve_documents rather than as_retriever so the
+    chain shares the direct path's query retries and per-query nprobe. The
+    chain is invoked with {"question": ..., "nprobe": ...}.
+    """
+    llm = get_llm(model_option, temperature)
+    
+    def retrieve_context(inputs):
+        docs = retrieve_documents(
+            inputs["question"], _vector_store, _vector_store.embedding_function, inputs["nprobe"]
+        )
+        logger.debug(f"Retrieved {len(docs)} chunks")
+        return "\n\n".join(doc.page_content for doc in docs)
+    
+    return (
+        {"context": RunnableLambda(retrieve_context), "question": itemgetter("question")}
+        | PROMPT
+        | llm
+        | StrOutputParser()
+    )
+
+def retrieve_documents(question, vector_store, embedding, nprobe, k=RETRIEVAL_K):
+    """
+    Find the k chunks closest to the question with a direct FAISS search.
+    """
+    query_vector = np.asarray([_embed_query(question, embedding)], dtype="float32")
+    params = get_search_params(vector_store.index, nprobe)
+    with getattr(vector_store, "search_lock", None) or nullcontext():
+        _, indices = vector_store.index.search(query_vector, k, params=params)
+    
+    # FAISS pads with -1 when the index holds fewer than k vectors
+    return [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+        for i in indices[0]
+        if i != -1
+    ]
+
+def _stream_direct(question, vector_store, embedding, model_option, temperature, nprobe):
+    """
+    Retrieve context and stream a single Claude call, bypassing LangChain runnables.
+    """
+    docs = retrieve_documents(question, vector_store, embedding, nprobe)
+    logger.debug(f"Retrieved {len(docs)} chunks")
+    
+    context = "\n\n".join(doc.page_content for doc in docs)
+    messages = PROMPT.format_messages(context=context, question=question)
+    
+    for message_chunk in get_llm(model_option, temperature).stream(messages):
+        if message_chunk.content:
+            yield message_chunk.content
+
+def get_rag_response(question, vector_store, embedding, model_option, temperature, nprobe,
+                     use_langchain_chain=False):
+    """
+    Stream the RAG response for a given question, token by token.
+    
+    This is a generator meant to be passed to st.write_stream. Errors are
+    logged and re-raised to the caller.
     """
     start_time = datetime.now()
     logger.info(f"Processing question: {question[:100]}...")
     
     try:
-        # Initialize LLM
-        logger.debug(f"Initializing LLM: {model_option} with temperature={temperature}")
-        llm = ChatAnthropic(model=model_option, temperature=temperature)
-        
-        # Create retriever
-        retriever = vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 4}
-        )
-        logger.debug("Retriever created")
-        
-        # Create prompt template
-        prompt = ChatPromptTemplate.from_template("""
-            Answer the question based on the provided context. 
-            If you don't know the answer or if the context doesn't contain 
-            relevant information, say you don't know.
-            
-            Context: {context}
-            
-            Question: {question}
-            
-            Answer:
-        """)
-        
-        # Create and execute chain
-        chain = (
-            {"context": retriever, "question": RunnablePassthrough()}
-            | prompt
-            | llm
-            | StrOutputParser()
-        )
+        if use_langchain_chain:
+            logger.debug("Streaming RAG chain...")
+            chain = _build_chain(model_option, temperature, id(vector_store), vector_store)
+            tokens = chain.stream({"question": question, "nprobe": nprobe})
+        else:
+            logger.debug("Streaming direct FAISS search + LLM call...")
+            tokens = _stream_direct(
+                question, vector_store, embedding, model_option, temperature, nprobe
+            )
         
-        logger.debug("Invoking RAG chain...")
-        response = chain.invoke(question)
+        first_token = True
+        for token in tokens:
+            if first_token:
+                first_token_time = (datetime.now() - start_time).total_seconds()
+                logger.info(f"First token received after {first_token_time:.2f} seconds")
+                first_token = False
+            yield token
         
         response_time = (datetime.now() - start_time).total_seconds()
         logger.info(f"Response generated in {response_time:.2f} seconds")
         
-        return response
-        
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}", exc_info=True)
-        return f"Error: {str(e)}"
+        raise
 
 # ============================================
 # FILE UPLOAD SECTION
 # ============================================
 
+def cancel_batch_and_build_live(cache_path):
+    """
+    Button callback: cancel the pending batch and switch to live indexing.
+    
+    Runs before the rerun, so the toggle can still be changed.
+    """
+    cancel_embedding_batch(cache_path)
+    st.session_state.use_batch_api = False
+
 st.header("📤 Upload Document")
 uploaded_file = st.file_uploader(
     "Choose a PDF file", 
@@ -370,28 +1191,47 @@ uploaded_file = st.file_uploader(
 if uploaded_file is not None:
     logger.debug(f"File uploaded: {uploaded_file.name}, Size: {uploaded_file.size} bytes")
     
-    if uploaded_file.name != st.session_state.processed_file:
+    if uploaded_file.name != session.processed_file:
         logger.info(f"New file detected: {uploaded_file.name}")
         
         with st.spinner("🔄 Processing PDF... This may take a few moments."):
             vector_store, stats, chunks, embedding = process_pdf(
                 uploaded_file, 
                 chunk_size, 
-                chunk_overlap
+                chunk_overlap,
+                embedding_dimensions,
+                use_batch_api
             )
             
             if vector_store is not None:
-                st.session_state.vector_store = vector_store
-                st.session_state.chunks = chunks
-                st.session_state.embedding = embedding
-                st.session_state.processed_file = uploaded_file.name
-                st.session_state.processing_stats = stats
-                st.session_state.chat_history = []
+                session.vector_store = vector_store
+                session.chunks = chunks
+                session.embedding = embedding
+                session.processed_file = uploaded_file.name
+                session.processing_stats = stats
+                session.chat_history = new_chat_history()
                 
                 st.success(f"✅ Successfully processed {uploaded_file.name}")
 
                     
                 logger.info(f"File {uploaded_file.name} ready for questioning")
+            elif stats is not None:
+                st.info(
+                    f"⏳ Embedding batch `{stats['batch_id']}` is {stats['batch_status']} "
+                    f"({stats['batch_progress']}). The OpenAI Batch API can take up to 24 hours; "
+                    "the document is indexed once the batch completes."
+                )
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.button("🔄 Check Status")
+                with col2:
+                    st.button(
+                        "✖️ Cancel and Build Live",
+                        on_click=cancel_batch_and_build_live,
+                        args=(stats["cache_path"],)
+                    )
+                st.stop()
             else:
                 st.error("❌ Failed to process PDF. Check the logs for details.")
                 logger.error(f"Failed to process file: {uploaded_file.name}")
@@ -404,7 +1244,7 @@ if uploaded_file is not None:
 # QUESTION ANSWERING SECTION
 # ============================================
 
-if st.session_state.vector_store is not None:
+if session.vector_store is not None:
     st.divider()
     st.header("❓ Ask Questions")
     
@@ -421,41 +1261,52 @@ if st.session_state.vector_store is not None:
     if ask_button and question:
         logger.info(f"User asked: {question}")
         
-        with st.spinner(" Thinking..."):
-            response = get_rag_response(
-                question,
-                st.session_state.vector_store,
-                model_option,
-                temperature
-            )
+        # Stream the answer into a placeholder, then move it into the history
+        answer_placeholder = st.empty()
+        try:
+            with answer_placeholder.container():
+                response = st.write_stream(get_rag_response(
+                    question,
+                    session.vector_store,
+                    session.embedding,
+                    model_option,
+                    temperature,
+                    nprobe,
+                    use_langchain_chain
+                ))
+            answer_placeholder.empty()
             
-            if not response.startswith("Error:"):
-                st.session_state.chat_history.append({
-                    "question": question,
-                    "answer": response,
-                    "timestamp": datetime.now().strftime("%H:%M:%S"),
-                    "model": model_option
-                })
-                logger.info("Response added to chat history")
-            else:
-                st.error(response)
-                logger.error(f"Error response: {response}")
+            chat_history = session.chat_history
+            chat_history["questions"].append(question)
+            chat_history["answers"].append(response)
+            chat_history["timestamps"].append(datetime.now().strftime("%H:%M:%S"))
+            chat_history["models"].append(model_option)
+            logger.info("Response added to chat history")
+            
+        except Exception as e:
+            answer_placeholder.empty()
+            st.error(f"Error: {str(e)}")
+            logger.error(f"Error response: {str(e)}")
     
     elif ask_button and not question:
         st.warning("⚠️ Please enter a question first!")
         logger.warning("Empty question submitted")
     
     # Display chat history
-    if st.session_state.chat_history:
+    chat_history = session.chat_history
+    questions = chat_history["questions"]
+    if questions:
         st.divider()
         st.header("💬 Chat History")
         
-        for i, chat in enumerate(reversed(st.session_state.chat_history)):
-            idx = len(st.session_state.chat_history) - i
+        answers = chat_history["answers"]
+        timestamps = chat_history["timestamps"]
+        models = chat_history["models"]
+        for i in range(len(questions) - 1, -1, -1):
             with st.container():
-                st.markdown(f"** Q{idx}:** {chat['question']}")
-                st.markdown(f"** A:** {chat['answer']}")
-                st.caption(f" {chat.get('timestamp', 'N/A')} |  {chat.get('model', 'N/A')}")
+                st.markdown(f"** Q{i + 1}:** {questions[i]}")
+                st.markdown(f"** A:** {answers[i]}")
+                st.caption(f" {timestamps[i]} |  {models[i]}")
                 st.divider()
 
 else:
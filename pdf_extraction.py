@@ -0,0 +1,15 @@
+# ============================================
+# PDF TEXT EXTRACTION WORKER
+# ============================================
+# PyMuPDF is not thread-safe, so parallel extraction runs in separate
+# processes. The worker lives in its own module so spawned processes can
+# import it without re-running the Streamlit script in app.py.
+import pymupdf
+
+
+def extract_page_texts(pdf_path, start, stop):
+    """
+    Extract the text of pages [start, stop) from the PDF at pdf_path.
+    """
+    with pymupdf.open(pdf_path, filetype="pdf") as pdf:
+        return [pdf[page_number].get_text() for page_number in range(start, stop)]